@@ -7,6 +7,11 @@
 # moves. Now the update_all_moves function does one scan and passes each piece through its appropriate updating
 # function. Other than these two things, everything is the same.
 
+import copy
+import random
+import threading
+import time
+
 
 class Piece:
     """Used to represent all pieces in the game."""
@@ -52,11 +57,40 @@ class Piece:
         """To change the location data member."""
         self._location = move
 
+    def has_crossed_river(self):
+        """Whether the piece is on the opponent's side of the river."""
+        if self._team == 'r':
+            return self._location[0] >= 6
+        return self._location[0] <= 5
+
+
+def make_zobrist_keys():
+    """Makes a random 64 bit number for every piece icon on every space, plus one for black to move. XORing together
+    the numbers for everything on the board gives a key for the position that can be updated a move at a time.
+    The seed is fixed so keys are the same every run."""
+    rng = random.Random(31020)
+    keys = {'turn': rng.getrandbits(64)}
+    for icon in [type + team for team in 'rb' for type in 'SAEHCRG']:
+        for rank in range(1, 11):
+            for file in range(1, 10):
+                keys[(icon, (rank, file))] = rng.getrandbits(64)
+    return keys
+
 
 class Board:
     """This is the main brain class. Dictates how each piece on the board can move, keeps track of the check and
     checkmate situation, whose turn it is, and contains a printable readout of the board."""
 
+    zobrist = make_zobrist_keys()
+
+    # How many times a position has to come up before the repetition rules kick in.
+    repetition_limit = 3
+
+    # How the Asian rules rank pieces when deciding whether attacking a defended piece is a chase. Only a chase if
+    # the target ranks higher than the attacker. Separate from Search's values so changing the evaluation doesn't
+    # change the rules.
+    chase_ranks = {'R': 3, 'H': 2, 'C': 2, 'A': 1, 'E': 1, 'S': 1}
+
     def __init__(self):
         """Initializes all the data types, adds the pieces, sets their potential moves."""
 
@@ -126,8 +160,47 @@ class Board:
 
         # Sets potential moves for all pieces, updates display.
         self.update_all_moves()
+        self.reset_history()
         self.update_board()
 
+    def reset_history(self):
+        """Starts the move history, the position keys and the repetition counters over from the current position."""
+        self._history = []
+        self._draw = False
+        self._key = self.compute_key()
+
+        # _key_history has the key of every position so far, _key_counts how many times each one came up, and
+        # _last_seen the index in _key_history where it last came up. Together they make repetitions O(1) to find.
+        self._key_history = [self._key]
+        self._key_counts = {self._key: 1}
+        self._last_seen = {self._key: 0}
+
+        # Set while update_repetition replays a cycle, so replaying doesn't count as another repetition.
+        self._replaying = False
+
+    def compute_key(self):
+        """Works out the key of the current position from scratch."""
+        key = 0
+        for location in self._pieces:
+            key ^= self.zobrist[(self._pieces[location].get_icon(), location)]
+        if self._turn == 'b':
+            key ^= self.zobrist['turn']
+        return key
+
+    def get_position_key(self):
+        """Retrieves the key of the current position."""
+        return self._key
+
+    def get_repetition_count(self, key=None):
+        """Retrieves how many times a position (the current one by default) has come up."""
+        if key is None:
+            key = self._key
+        return self._key_counts.get(key, 0)
+
+    def get_draw(self):
+        """Retrieves whether the game was drawn by repetition."""
+        return self._draw
+
     def update_board(self):
         """Sets each space on the board to the appropriate piece icon or blank."""
         for i in range(1, 11):
@@ -157,6 +230,79 @@ class Board:
         """Retrieves who is in check."""
         return self._in_check
 
+    def get_turn(self):
+        """Retrieves whose turn it is."""
+        return self._turn
+
+    def get_pieces(self):
+        """Retrieves the pieces dict, keyed by location."""
+        return self._pieces
+
+    def load_fen(self, fen):
+        """Sets the board up from a FEN string, the way engines and GUIs pass positions around. The first row of
+        the FEN is black's back rank. Returns False and leaves the board alone if the FEN doesn't make sense."""
+
+        # FEN letters to the types used here. Elephants and horses show up as either letter depending on the GUI.
+        fen_types = {'k': 'G', 'a': 'A', 'b': 'E', 'e': 'E', 'n': 'H', 'h': 'H', 'r': 'R', 'c': 'C', 'p': 'S'}
+
+        fields = fen.split()
+        if not fields:
+            return False
+        rows = fields[0].split('/')
+        if len(rows) != 10:
+            return False
+
+        pieces = {}
+        for i in range(10):
+            rank = 10 - i
+            file = 1
+            for char in rows[i]:
+                if char.isdigit():
+                    file += int(char)
+                elif char.lower() in fen_types and file <= 9:
+                    team = 'r' if char.isupper() else 'b'
+                    pieces[(rank, file)] = Piece((rank, file), team, fen_types[char.lower()])
+                    file += 1
+                else:
+                    return False
+            if file != 10:
+                return False
+
+        # Needs exactly one general a side, flying_general counts on it.
+        generals = [pieces[location].get_icon() for location in pieces if pieces[location].get_type() == 'G']
+        if sorted(generals) != ['Gb', 'Gr']:
+            return False
+
+        turn = 'r'
+        if len(fields) > 1:
+            if fields[1] in ['w', 'r']:
+                turn = 'r'
+            elif fields[1] == 'b':
+                turn = 'b'
+            else:
+                return False
+
+        # Swaps the new position in, but keeps the old one around in case the new one turns out to be illegal.
+        old_state = (self._pieces, self._turn, self._winner)
+        self._pieces = pieces
+        self._turn = turn
+        self._winner = None
+        self.update_all_moves()
+
+        # The side that just moved can't be left in check.
+        if (self._in_check is not None and self._in_check != self._turn) or self.flying_general():
+            self._pieces, self._turn, self._winner = old_state
+            self.update_all_moves()
+            return False
+
+        self.reset_history()
+
+        if self._in_check is not None:
+            self.update_winner()
+
+        self.update_board()
+        return True
+
     def update_soldier_moves(self, soldier):
         """Sets the potential moves of the soldier passed through."""
 
@@ -586,8 +732,8 @@ class Board:
             self._winner = winnahs[self._turn]
             return
 
-    def update_all_moves(self):
-        """Updates each piece according to it's type."""
+    def update_moves(self, piece):
+        """Updates a single piece according to it's type."""
         # I decided this was nicer than a huge string of elif's.
         update_dict = {
             'S': self.update_soldier_moves,
@@ -598,19 +744,147 @@ class Board:
             'C': self.update_cannon_moves,
             'H': self.update_horse_moves,
         }
+        update_dict[piece.get_type()](piece)
 
+    def update_all_moves(self):
+        """Updates each piece according to it's type."""
         for piece in [self._pieces[i] for i in self._pieces]:
             if piece.get_location() != 'captured':
-                pc_type = piece.get_type()
-                update_dict[pc_type](piece)
+                self.update_moves(piece)
 
         self.update_potential_move_sets()
         self.set_in_check()
 
+    def make_raw_move(self, loc1, loc2):
+        """Moves a piece without any of move_piece's checks or bookkeeping, and returns what it captured, if
+        anything. Potential moves aren't updated."""
+        captured = self._pieces.get(loc2)
+        if captured is not None:
+            captured.move('captured')
+        self._pieces[loc2] = self._pieces.pop(loc1)
+        self._pieces[loc2].move(loc2)
+        return captured
+
+    def unmake_raw_move(self, loc1, loc2, captured):
+        """Takes back a move made with make_raw_move."""
+        self._pieces[loc1] = self._pieces.pop(loc2)
+        self._pieces[loc1].move(loc1)
+        if captured is not None:
+            self._pieces[loc2] = captured
+            captured.move(loc2)
+
+    def leaves_in_check(self, loc1, loc2):
+        """Checks whether moving from loc1 to loc2 would leave the mover's general in check (or facing the other
+        general), whoever's turn it is."""
+
+        team = self._pieces[loc1].get_team()
+        captured = self.make_raw_move(loc1, loc2)
+        self.update_all_moves()
+
+        general = [piece for piece in self._pieces.values() if piece.get_icon() == 'G' + team][0]
+        if team == 'r':
+            enemy_moves = self._black_potential_moves
+        else:
+            enemy_moves = self._red_potential_moves
+        in_check = general.get_location() in enemy_moves or self.flying_general()
+
+        self.unmake_raw_move(loc1, loc2, captured)
+        self.update_all_moves()
+        return in_check
+
+    def is_defended(self, loc1, loc2):
+        """Checks whether, if the piece on loc1 took the piece on loc2, one of the taken piece's teammates could
+        legally take back."""
+
+        team = self._pieces[loc2].get_team()
+        captured = self.make_raw_move(loc1, loc2)
+        self.update_all_moves()
+
+        defended = False
+        for location in list(self._pieces):
+            piece = self._pieces[location]
+            if piece.get_team() == team and loc2 in piece.get_potential_moves():
+                if not self.leaves_in_check(location, loc2):
+                    defended = True
+                    break
+
+        self.unmake_raw_move(loc1, loc2, captured)
+        self.update_all_moves()
+        return defended
+
+    def chased_pieces(self, team):
+        """Finds the enemy pieces team is chasing: ones it could legally take, that are either not defended or
+        rank above the attacker in chase_ranks. Following the Asian rules, generals and soldiers are allowed to
+        chase, and soldiers that haven't crossed the river can't be chased."""
+
+        chased = set()
+        for location in list(self._pieces):
+            attacker = self._pieces[location]
+            if attacker.get_team() != team or attacker.get_type() in ['G', 'S']:
+                continue
+
+            for move in attacker.get_potential_moves():
+                if move not in self._pieces:
+                    continue
+                target = self._pieces[move]
+                if target in chased or target.get_type() == 'G':
+                    continue
+                if target.get_type() == 'S' and not target.has_crossed_river():
+                    continue
+                if self.leaves_in_check(location, move):
+                    continue
+                if self.chase_ranks[target.get_type()] > self.chase_ranks[attacker.get_type()]:
+                    chased.add(target)
+                elif not self.is_defended(location, move):
+                    chased.add(target)
+
+        return chased
+
+    def update_repetition(self, cycle):
+        """Called when a position comes up for the repetition_limit'th time. cycle is how many moves ago it last
+        came up. Takes the cycle back and plays it again to see which side checked, or checked or chased, with
+        every one of its moves. Under the Asian rules a side that kept checking loses, then a side that kept
+        chasing (or checking) loses, and otherwise it's a draw."""
+
+        moves = []
+        for i in range(cycle):
+            moves.append(self._history[-1][:2])
+            self.undo_move()
+        moves.reverse()
+
+        perpetual_check = {'r': True, 'b': True}
+        perpetual_chase = {'r': True, 'b': True}
+        winnahs = {'r': 'b', 'b': 'r'}
+
+        self._replaying = True
+        for loc1, loc2 in moves:
+            team = self._turn
+
+            # Pieces being chased after the move that weren't before, including ones uncovered by the move.
+            chased = set()
+            if perpetual_chase[team]:
+                chased = self.chased_pieces(team)
+            self.move_piece(loc1, loc2)
+            check = self._in_check == winnahs[team]
+
+            perpetual_check[team] = perpetual_check[team] and check
+            if perpetual_chase[team] and not check:
+                perpetual_chase[team] = bool(self.chased_pieces(team) - chased)
+        self._replaying = False
+
+        checkers = [team for team in 'rb' if perpetual_check[team]]
+        chasers = [team for team in 'rb' if perpetual_chase[team]]
+        if len(checkers) == 1:
+            self._winner = winnahs[checkers[0]]
+        elif not checkers and len(chasers) == 1:
+            self._winner = winnahs[chasers[0]]
+        else:
+            self._draw = True
+
     def move_piece(self, loc1, loc2):
         """Makes a legal move. Returns False otherwise."""
 
-        if self._winner is not None:
+        if self._winner is not None or self._draw:
             return False
 
         # If there is even a piece there
@@ -657,29 +931,361 @@ class Board:
 
             return False
 
+        captured = None
         if 'captured' in self._pieces:
+            captured = self._pieces['captured']
             del self._pieces['captured']
 
+        # Updates the position key for just the pieces that changed.
+        icon = piece1.get_icon()
+        self._key ^= self.zobrist[(icon, loc1)] ^ self.zobrist[(icon, loc2)] ^ self.zobrist['turn']
+        if captured is not None:
+            self._key ^= self.zobrist[(captured.get_icon(), loc2)]
+
+        # Counts the new position.
+        ply = len(self._key_history)
+        previous = self._last_seen.get(self._key)
+        self._key_history.append(self._key)
+        self._key_counts[self._key] = self._key_counts.get(self._key, 0) + 1
+        self._last_seen[self._key] = ply
+
+        # Remembers the move, and where the position was last seen, so undo_move can take it back.
+        self._history.append((loc1, loc2, captured, previous))
+
         if self._in_check is not None:
             self.update_winner()
 
+        if self._winner is None and not self._replaying and self._key_counts[self._key] >= self.repetition_limit:
+            self.update_repetition(ply - previous)
+
+        self.update_board()
+
+        return True
+
+    def undo_move(self):
+        """Takes back the last move made with move_piece. Returns False if there is nothing to take back."""
+
+        if not self._history:
+            return False
+
+        loc1, loc2, captured, previous = self._history.pop()
+
+        # Uncounts the position being left.
+        key = self._key_history.pop()
+        self._key_counts[key] -= 1
+        if self._key_counts[key] == 0:
+            del self._key_counts[key]
+            del self._last_seen[key]
+        else:
+            self._last_seen[key] = previous
+        self._key = self._key_history[-1]
+
+        # Puts the piece back, and the captured one too if there was one.
+        self._pieces[loc1] = self._pieces[loc2]
+        self._pieces[loc1].move(loc1)
+        del self._pieces[loc2]
+        if captured is not None:
+            self._pieces[loc2] = captured
+            captured.move(loc2)
+
+        # move_piece doesn't allow moves once the game is over, so it wasn't before this move.
+        self.next_turn()
+        self._winner = None
+        self._draw = False
+        self.update_all_moves()
         self.update_board()
 
         return True
 
 
+class Search:
+    """Looks ahead from the board's current position to pick a move for whoever's turn it is. Uses alpha-beta with
+    iterative deepening, so there's always a best move from the last finished depth. Every move it tries is undone
+    again, so the board is left how it was found. stop() can be called from another thread."""
+
+    # Rough material values. Soldiers are worth twice as much once they've crossed the river.
+    values = {'S': 10, 'A': 20, 'E': 20, 'H': 40, 'C': 45, 'R': 90, 'G': 0}
+    mate = 100000
+    max_depth = 64
+
+    def __init__(self, board):
+        """Sets the board to search on and clears the results."""
+        self._board = board
+        self._stop = threading.Event()
+        self._deadline = None
+        self._depth_limit = self.max_depth
+        self._aborted = False
+        self._nodes = 0
+        self._depth = 0
+        self._score = 0
+        self._best_move = None
+
+    def stop(self):
+        """Asks the search to stop. It finishes up after the move it's currently trying."""
+        self._stop.set()
+
+    def set_limits(self, depth=None, movetime=None):
+        """Changes the limits of a search that's already running, like when pondering turns into thinking about
+        the real position. movetime is counted from now."""
+        if movetime is not None:
+            self._deadline = time.monotonic() + movetime
+        if depth is not None:
+            self._depth_limit = depth
+            # Already deep enough, the depth in progress isn't needed.
+            if self._depth >= depth:
+                self.stop()
+
+    def get_best_move(self):
+        """Retrieves the best move found so far as a (from, to) pair of board locations, or None."""
+        return self._best_move
+
+    def get_depth(self):
+        """Retrieves the last depth that was fully searched."""
+        return self._depth
+
+    def get_score(self):
+        """Retrieves the score of the best move, from the point of view of the side to move."""
+        return self._score
+
+    def get_nodes(self):
+        """Retrieves how many positions have been looked at."""
+        return self._nodes
+
+    def run(self, depth=None, movetime=None, report=None):
+        """Searches one depth at a time until depth is reached, movetime (in seconds) runs out, or stop() is
+        called. With neither limit it runs until stopped. report, if given, is called with the search after each
+        finished depth. Returns the best move."""
+
+        self.set_limits(depth, movetime)
+
+        # The limits are looked at every time around, set_limits can change them while this runs.
+        current_depth = 0
+        while current_depth < self._depth_limit:
+            current_depth += 1
+            move, score = self.search_root(current_depth)
+
+            # A depth that got cut off is only trusted if nothing had finished yet.
+            if self._aborted:
+                if self._best_move is None:
+                    self._best_move = move
+                break
+
+            self._best_move = move
+            self._score = score
+            self._depth = current_depth
+            if report is not None:
+                report(self)
+
+            # No point looking deeper once a forced mate is found, or if there's nothing to play.
+            if move is None or abs(score) >= self.mate - self.max_depth:
+                break
+
+        return self._best_move
+
+    def out_of_time(self):
+        """Checks whether the search has been stopped or has run out of time."""
+        if self._stop.is_set() or (self._deadline is not None and time.monotonic() >= self._deadline):
+            self._aborted = True
+        return self._aborted
+
+    def evaluate(self):
+        """Scores the position by material, from the point of view of the side to move."""
+        score = 0
+        for piece in self._board.get_pieces().values():
+            value = self.values[piece.get_type()]
+            if piece.get_type() == 'S' and piece.has_crossed_river():
+                value *= 2
+            if piece.get_team() == 'r':
+                score += value
+            else:
+                score -= value
+
+        if self._board.get_turn() == 'r':
+            return score
+        return -score
+
+    def ordered_moves(self, first=None):
+        """Lists every potential move for the side to move, captures of the biggest pieces first. Some of them
+        might still turn out to be illegal, move_piece sorts that out."""
+        pieces = self._board.get_pieces()
+        turn = self._board.get_turn()
+        moves = []
+        for location in pieces:
+            if pieces[location].get_team() == turn:
+                for move in pieces[location].get_potential_moves():
+                    moves.append((location, move))
+
+        def order(move):
+            if move == first:
+                return -1000
+            if move[1] in pieces:
+                return self.values[pieces[move[0]].get_type()] - 10 * self.values[pieces[move[1]].get_type()]
+            return 0
+
+        moves.sort(key=order)
+        return moves
+
+    def end_score(self, ply):
+        """Scores a finished game from the point of view of the side to move."""
+        if self._board.get_winner() == self._board.get_turn():
+            return self.mate - ply
+        return -self.mate + ply
+
+    def search_root(self, depth):
+        """Searches the current position to the given depth. Returns the best move and its score."""
+        board = self._board
+        best_move = None
+        alpha = -self.mate - 1
+        beta = self.mate + 1
+
+        for loc1, loc2 in self.ordered_moves(self._best_move):
+            if self.out_of_time():
+                break
+            if not board.move_piece(loc1, loc2):
+                continue
+            score = -self.negamax(depth - 1, -beta, -alpha, 1)
+            board.undo_move()
+
+            # A cut off score isn't worth anything, unless there's no move at all yet.
+            if self._aborted:
+                if best_move is None:
+                    best_move = (loc1, loc2)
+                break
+            if best_move is None or score > alpha:
+                alpha = score
+                best_move = (loc1, loc2)
+
+        return best_move, alpha
+
+    def negamax(self, depth, alpha, beta, ply):
+        """Alpha-beta search of the current position. Returns its score from the point of view of the side to
+        move."""
+        self._nodes += 1
+        board = self._board
+
+        if board.get_winner() is not None:
+            return self.end_score(ply)
+        if board.get_draw():
+            return 0
+        if depth == 0:
+            return self.evaluate()
+
+        # Stays at a loss if no legal move is found, stalemate loses in Xiangqi.
+        best = -self.mate + ply
+        for loc1, loc2 in self.ordered_moves():
+            if self.out_of_time():
+                return 0
+            if not board.move_piece(loc1, loc2):
+                continue
+            score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            board.undo_move()
+
+            if self._aborted:
+                return 0
+            if score > best:
+                best = score
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+
+        return best
+
+
+class Ponder:
+    """Thinks on the opponent's time. Guesses the move the side to move will make, plays it on a copy of the board
+    and searches the position after it, all on a thread of its own."""
+
+    # How deep to look when guessing the opponent's move. Kept shallow so the real pondering starts quickly.
+    guess_depth = 2
+
+    def __init__(self, board):
+        """Copies the board and starts the thread."""
+        self._board = copy.deepcopy(board)
+        self._lock = threading.Lock()
+        self._stopped = False
+        self._predicted_move = None
+        self._search = None
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def run(self):
+        """Runs on the ponder thread. Guesses the move, then searches the position after it until told to stop."""
+
+        with self._lock:
+            if self._stopped:
+                return
+            self._search = Search(self._board)
+        move = self._search.run(depth=self.guess_depth)
+        if move is None:
+            return
+
+        search = Search(self._board)
+        with self._lock:
+            if self._stopped:
+                return
+            # The real search has to be in place before anyone can see the guess and call finish.
+            self._board.move_piece(*move)
+            self._search = search
+            self._predicted_move = move
+        search.run()
+
+    def stop(self):
+        """Stops pondering and waits for the thread to finish. Only takes as long as one move of the search."""
+        with self._lock:
+            self._stopped = True
+            if self._search is not None:
+                self._search.stop()
+        self._thread.join()
+
+    def finish(self, depth=None, movetime=None):
+        """Turns pondering into thinking for real after the predicted move was played. Waits for the search to
+        reach depth or use up movetime (in seconds), and returns its best move."""
+        with self._lock:
+            search = self._search
+            search.set_limits(depth, movetime)
+        self._thread.join()
+        return search.get_best_move()
+
+    def get_predicted_move(self):
+        """Retrieves the guessed move, or None while it's still guessing."""
+        return self._predicted_move
+
+    def get_search(self):
+        """Retrieves the search running right now."""
+        with self._lock:
+            return self._search
+
+    def is_alive(self):
+        """Checks whether the thread is still working."""
+        return self._thread.is_alive()
+
+
 class XiangqiGame:
     """This is how you start a new game."""
 
     def __init__(self):
         self._board = Board()
 
+        # Pondering. _engine_team is the side the engine plays, or None when pondering is off. _ponder is working
+        # on a guessed move, _analysis is a ponder whose guess was right, so it's now searching the position on the
+        # board.
+        self._engine_team = None
+        self._ponder = None
+        self._analysis = None
+        self._ponder_hits = 0
+        self._ponder_misses = 0
+        self._ponder_unready = 0
+
     def show_board(self):
         self._board.show_board()
 
     def get_game_state(self):
         """Returns the state of the game."""
 
+        if self._board.get_draw():
+            return 'DRAW'
+
         board_state = self._board.get_winner()
         state_convert = {'r': 'RED_WON', 'b': 'BLACK_WON', None: 'UNFINISHED'}
         return state_convert[board_state]
@@ -690,8 +1296,8 @@ class XiangqiGame:
     def make_move(self, move_from, move_to):
         """To make a move. Please use coordinates like 'b4'."""
 
-        # If the game has been won already.
-        if self._board.get_winner() is not None:
+        # If the game has been won or drawn already.
+        if self._board.get_winner() is not None or self._board.get_draw():
             return False
 
         # Converts user input coordinates to coordinates friendly to the board
@@ -703,5 +1309,127 @@ class XiangqiGame:
         except KeyError:
             return False
 
-        return self._board.move_piece(loc1, loc2)
+        team = self._board.get_turn()
+        if not self._board.move_piece(loc1, loc2):
+            return False
+
+        if self._engine_team is not None:
+            self.update_ponder((loc1, loc2), team)
+
+        return True
+
+    def convert_location(self, location):
+        """Converts a board location back into coordinates like 'b4'."""
+        return 'abcdefghi'[location[1] - 1] + str(location[0])
+
+    def start_pondering(self, team):
+        """Turns pondering on for the engine playing team ('red' or 'black'). From now on, after each of its moves
+        the game guesses the opponent's reply and starts thinking about the position after it in the background."""
+        self.drop_ponder()
+        self._engine_team = team[0].lower()
+        if self._board.get_turn() != self._engine_team:
+            self.start_ponder()
+
+    def stop_pondering(self):
+        """Turns pondering off, dropping any background work."""
+        self._engine_team = None
+        self.drop_ponder()
+
+    def start_ponder(self):
+        """Starts pondering on the opponent's reply, unless the game is over."""
+        if self._board.get_winner() is None and not self._board.get_draw():
+            self._ponder = Ponder(self._board)
+
+    def drop_ponder(self):
+        """Stops and forgets any background work."""
+        for ponder in [self._ponder, self._analysis]:
+            if ponder is not None:
+                ponder.stop()
+        self._ponder = None
+        self._analysis = None
+
+    def update_ponder(self, move, team):
+        """Called after each move while pondering, with the team that made it. After the engine's own move, the
+        opponent's reply gets pondered. After the opponent's move, if it was the one being pondered on, that work
+        carries on as analysis of the new position, otherwise it's dropped."""
+
+        if team == self._engine_team:
+            self.drop_ponder()
+            self.start_ponder()
+            return
+
+        # Only a finished guess counts as a hit or a miss.
+        if self._ponder is not None:
+            predicted = self._ponder.get_predicted_move()
+            if predicted is None:
+                self._ponder_unready += 1
+            elif predicted == move:
+                self._ponder_hits += 1
+                self._analysis = self._ponder
+                self._ponder = None
+                return
+            else:
+                self._ponder_misses += 1
+
+        self.drop_ponder()
+
+    def get_ponder_status(self):
+        """Returns a dict describing the pondering. 'state' is one of 'OFF', 'IDLE', 'GUESSING', 'PONDERING' or
+        'ANALYZING' (the guess was right and the work is being kept), the rest are counters. 'unready' counts the
+        opponent moves made before a guess was ready, they aren't hits or misses."""
+
+        ponder = self._analysis or self._ponder
+        if self._engine_team is None:
+            state = 'OFF'
+        elif self._analysis is not None:
+            state = 'ANALYZING'
+        elif ponder is None or not ponder.is_alive():
+            state = 'IDLE'
+        elif ponder.get_predicted_move() is None:
+            state = 'GUESSING'
+        else:
+            state = 'PONDERING'
+
+        predicted = None
+        depth = 0
+        nodes = 0
+        if ponder is not None and ponder.get_predicted_move() is not None:
+            loc1, loc2 = ponder.get_predicted_move()
+            predicted = (self.convert_location(loc1), self.convert_location(loc2))
+            depth = ponder.get_search().get_depth()
+            nodes = ponder.get_search().get_nodes()
+
+        guesses = self._ponder_hits + self._ponder_misses
+        return {
+            'state': state,
+            'predicted_move': predicted,
+            'depth': depth,
+            'nodes': nodes,
+            'hits': self._ponder_hits,
+            'misses': self._ponder_misses,
+            'unready': self._ponder_unready,
+            'hit_rate': self._ponder_hits / guesses if guesses else 0.0,
+        }
+
+    def get_engine_move(self, depth=None, movetime=None):
+        """Works out a move for whoever's turn it is, searching to depth or for movetime seconds (depth 3 if
+        neither is given). If pondering already guessed the last move right, that work is picked up where it is.
+        Returns a pair of coordinates like ('h3', 'e3') to pass to make_move, or None if there's no move."""
+
+        if self._board.get_winner() is not None or self._board.get_draw():
+            return None
+        if depth is None and movetime is None:
+            depth = 3
+
+        if self._analysis is not None:
+            move = self._analysis.finish(depth, movetime)
+            self._analysis = None
+        else:
+            # The board can't be shared with a ponder thread while it's searched here.
+            self.drop_ponder()
+            move = Search(self._board).run(depth, movetime)
+
+        if move is None:
+            return None
+        return self.convert_location(move[0]), self.convert_location(move[1])
 
@@ -0,0 +1,149 @@
+import time
+import unittest
+from unittest import mock
+
+from Game import Board, Ponder, XiangqiGame
+
+
+class PonderTest(unittest.TestCase):
+    """Tests pondering on XiangqiGame."""
+
+    def setUp(self):
+        self.game = XiangqiGame()
+
+    def tearDown(self):
+        self.game.stop_pondering()
+
+    def wait_for_guess(self):
+        """Waits until the ponder thread has guessed the opponent's move, and returns it."""
+        for i in range(500):
+            status = self.game.get_ponder_status()
+            if status['predicted_move'] is not None:
+                return status['predicted_move']
+            time.sleep(0.01)
+        self.fail('no move was guessed')
+
+    def test_only_ponders_after_engine_moves(self):
+        self.game.start_pondering('red')
+        self.assertEqual(self.game.get_ponder_status()['state'], 'IDLE')
+
+        self.game.make_move(*self.game.get_engine_move(depth=1))
+        self.assertIn(self.game.get_ponder_status()['state'], ['GUESSING', 'PONDERING'])
+
+    def test_hit(self):
+        self.game.start_pondering('red')
+        self.game.make_move(*self.game.get_engine_move(depth=1))
+        self.game.make_move(*self.wait_for_guess())
+
+        status = self.game.get_ponder_status()
+        self.assertEqual(status['state'], 'ANALYZING')
+        self.assertEqual((status['hits'], status['misses']), (1, 0))
+        self.assertIsNotNone(self.game.get_engine_move(depth=1))
+
+    def test_miss(self):
+        self.game.start_pondering('red')
+        self.game.make_move(*self.game.get_engine_move(depth=1))
+        guess = self.wait_for_guess()
+        move = ('a7', 'a6') if guess != ('a7', 'a6') else ('i7', 'i6')
+        self.game.make_move(*move)
+
+        # The engine's turn now, nothing should be pondered until it moves.
+        status = self.game.get_ponder_status()
+        self.assertEqual(status['state'], 'IDLE')
+        self.assertEqual((status['hits'], status['misses'], status['hit_rate']), (0, 1, 0.0))
+
+    def test_engine_moves_not_counted(self):
+        self.game.make_move('b3', 'e3')
+        self.game.start_pondering('black')
+        self.game.make_move(*self.game.get_engine_move(depth=1))
+        status = self.game.get_ponder_status()
+        self.assertNotEqual(status['state'], 'IDLE')
+        self.assertEqual((status['hits'], status['misses']), (0, 0))
+
+    def test_move_before_guess_is_not_a_miss(self):
+        # Keeps the ponder thread from ever guessing.
+        with mock.patch.object(Ponder, 'run', lambda ponder: None):
+            self.game.start_pondering('red')
+            self.game.make_move(*self.game.get_engine_move(depth=1))
+            self.game.make_move('a7', 'a6')
+
+        status = self.game.get_ponder_status()
+        self.assertEqual((status['hits'], status['misses'], status['unready']), (0, 0, 1))
+        self.assertEqual(status['hit_rate'], 0.0)
+
+
+class RepetitionTest(unittest.TestCase):
+    """Tests repetition draws and perpetual check/chase adjudication."""
+
+    def play(self, fen, cycle, times=2):
+        """Sets up fen and plays the cycle of moves until the game ends or it's been played times times."""
+        game = XiangqiGame()
+        self.assertTrue(game._board.load_fen(fen))
+        for i in range(times):
+            for move in cycle:
+                self.assertTrue(game.make_move(*move), move)
+                if game.get_game_state() != 'UNFINISHED':
+                    return game
+        return game
+
+    def test_shuffle_is_draw(self):
+        game = XiangqiGame()
+        for i in range(2):
+            for move in [('b1', 'c3'), ('b10', 'c8'), ('c3', 'b1'), ('c8', 'b10')]:
+                game.make_move(*move)
+        self.assertEqual(game._board.get_repetition_count(), 3)
+        self.assertEqual(game.get_game_state(), 'DRAW')
+        self.assertFalse(game.make_move('a1', 'a2'))
+
+    def test_perpetual_check_loses(self):
+        game = self.play('3k5/9/9/9/3R5/9/9/9/9/5K3 b',
+                         [('d10', 'e10'), ('d6', 'e6'), ('e10', 'd10'), ('e6', 'd6')])
+        self.assertEqual(game.get_game_state(), 'BLACK_WON')
+
+    def test_perpetual_chase_loses(self):
+        # The red chariot keeps chasing the undefended black cannon.
+        game = self.play('3k5/9/9/9/8c/R8/9/9/9/5K3 w',
+                         [('a5', 'a6'), ('i6', 'i5'), ('a6', 'a5'), ('i5', 'i6')])
+        self.assertEqual(game.get_game_state(), 'BLACK_WON')
+
+    def test_chasing_defended_piece_is_draw(self):
+        # Same, but the black chariot defends the cannon.
+        game = self.play('3k4r/9/9/9/8c/R8/9/9/9/5K3 w',
+                         [('a5', 'a6'), ('i6', 'i5'), ('a6', 'a5'), ('i5', 'i6')])
+        self.assertEqual(game.get_game_state(), 'DRAW')
+
+    def test_discovered_chase_loses(self):
+        # The soldier moving aside uncovers a chariot on the black chariot each time.
+        game = self.play('5k3/2r6/9/9/2P6/9/9/9/9/2RRK4 w',
+                         [('c6', 'd6'), ('c9', 'd9'), ('d6', 'c6'), ('d9', 'c9')])
+        self.assertEqual(game.get_game_state(), 'BLACK_WON')
+
+    def test_pinned_piece_does_not_chase(self):
+        # The red chariot is pinned to its general, so it can't take the cannon, only the black chariot.
+        board = Board()
+        self.assertTrue(board.load_fen('4k4/9/3r5/9/9/9/9/3R3c1/9/3K5 w'))
+        chased = [piece.get_icon() for piece in board.chased_pieces('r')]
+        self.assertEqual(chased, ['Rb'])
+
+    def test_horse_and_cannon_rank_the_same(self):
+        # The red horse attacks the black cannon, but the black chariot defends it.
+        board = Board()
+        self.assertTrue(board.load_fen('3k2r2/9/9/9/9/9/9/6c2/9/4K2N1 w'))
+        self.assertEqual(board.chased_pieces('r'), set())
+
+        # Without the chariot it's a chase.
+        self.assertTrue(board.load_fen('3k5/9/9/9/9/9/9/6c2/9/4K2N1 w'))
+        self.assertEqual([piece.get_icon() for piece in board.chased_pieces('r')], ['Cb'])
+
+    def test_undo_restores_keys(self):
+        game = self.play('3k5/9/9/9/3R5/9/9/9/9/5K3 b',
+                         [('d10', 'e10'), ('d6', 'e6'), ('e10', 'd10'), ('e6', 'd6')])
+        board = game._board
+        while board.undo_move():
+            self.assertEqual(board.get_position_key(), board.compute_key())
+        self.assertEqual(board.get_repetition_count(), 1)
+        self.assertEqual(game.get_game_state(), 'UNFINISHED')
+
+
+if __name__ == '__main__':
+    unittest.main()
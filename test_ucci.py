@@ -0,0 +1,77 @@
+import io
+import time
+import unittest
+
+from ucci import UcciEngine
+
+
+class UcciEngineTest(unittest.TestCase):
+    """Tests the UCCI command loop."""
+
+    def setUp(self):
+        self.output = io.StringIO()
+        self.engine = UcciEngine(self.output)
+
+    def lines(self):
+        return self.output.getvalue().splitlines()
+
+    def go(self, command):
+        """Sends a go command and waits for the search to finish."""
+        self.engine.handle(command)
+        if self.engine._thread is not None:
+            self.engine._thread.join()
+        return self.lines()[-1]
+
+    def test_bestmove(self):
+        self.engine.handle('position fen 5k3/9/9/9/9/9/9/9/R8/3K5 w - - 0 1')
+        self.assertEqual(self.go('go depth 3'), 'bestmove d0e0')
+
+    def test_bad_fen_gives_nobestmove(self):
+        self.engine.handle('position fen 5k3/9/9/9/9/9/9/9/R8/3K5 w - - 0 1')
+        for command in ['position fen garbage', 'position fen', 'position nonsense',
+                        'position fen 4k4/9/9/9/9/9/9/9/4R4/3K5 w - - 0 1']:
+            self.engine.handle(command)
+            self.assertEqual(self.go('go depth 1'), 'nobestmove')
+
+        # A good position makes it search again.
+        self.engine.handle('position startpos')
+        self.assertTrue(self.go('go depth 1').startswith('bestmove'))
+
+    def test_illegal_move_gives_nobestmove(self):
+        self.engine.handle('position startpos moves h2e2 a0a5')
+        self.assertEqual(self.go('go depth 1'), 'nobestmove')
+        self.engine.handle('position startpos moves h2e2 h9g7')
+        self.assertTrue(self.go('go depth 1').startswith('bestmove'))
+
+    def test_position_is_updated_incrementally(self):
+        # Setting the board up again would fail.
+        board = self.engine._board
+        board.load_fen = None
+
+        # The same fen with more moves, then fewer, plays or takes back just the difference.
+        for moves, played in [('h2e2 h9g7', 2), ('h2e2 h9g7 h0g2', 3), ('h2e2', 1), ('', 0)]:
+            self.engine.handle('position startpos moves ' + moves)
+            self.assertIs(self.engine._board, board)
+            self.assertEqual(len(board._history), played)
+            self.assertEqual(board.get_position_key(), board.compute_key())
+
+    def test_movestogo_zero_is_sudden_death(self):
+        # go ponder keeps the limits until ponderhit, so they can be looked at.
+        self.engine.handle('position startpos')
+        self.engine.handle('go ponder time 30000 movestogo 0')
+        self.assertEqual(self.engine._ponder_limits, (None, 1.0))
+        self.engine.stop_search()
+
+    def test_ponder_waits_for_ponderhit(self):
+        self.engine.handle('position startpos')
+        self.engine.handle('go ponder depth 1')
+        time.sleep(0.5)
+        self.assertFalse(any(line.startswith('bestmove') for line in self.lines()))
+
+        self.engine.handle('ponderhit')
+        self.engine._thread.join()
+        self.assertTrue(self.lines()[-1].startswith('bestmove'))
+
+
+if __name__ == '__main__':
+    unittest.main()
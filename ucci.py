@@ -0,0 +1,220 @@
+# Description: Lets Xiangqi GUIs and arbiters talk to the game over UCCI. Run it with "python -m ucci" and it reads
+# commands from stdin and answers on stdout. One Board is kept for the whole session, and when a new position
+# command just adds moves onto the last one, only the new moves get played. Searches run on their own thread so
+# stop and quit get answered right away.
+
+import sys
+import threading
+
+from Game import Board, Search
+
+START_FEN = 'rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR w - - 0 1'
+
+
+def ucci_to_locations(move):
+    """Converts a UCCI move like 'h2e2' into a pair of board locations. UCCI counts ranks from 0, the board from
+    1. Returns None if the move doesn't make sense."""
+
+    letters = 'abcdefghi'
+    if len(move) != 4 or move[0] not in letters or move[2] not in letters:
+        return None
+    if not move[1].isdigit() or not move[3].isdigit():
+        return None
+
+    loc1 = (int(move[1]) + 1, letters.index(move[0]) + 1)
+    loc2 = (int(move[3]) + 1, letters.index(move[2]) + 1)
+    return loc1, loc2
+
+
+def locations_to_ucci(loc1, loc2):
+    """Converts a pair of board locations into a UCCI move like 'h2e2'."""
+    letters = 'abcdefghi'
+    return letters[loc1[1] - 1] + str(loc1[0] - 1) + letters[loc2[1] - 1] + str(loc2[0] - 1)
+
+
+class UcciEngine:
+    """Reads UCCI commands and answers them. Holds onto the board between commands."""
+
+    def __init__(self, output=sys.stdout):
+        """Starts off on the opening position with nothing searching."""
+        self._output = output
+        self._output_lock = threading.Lock()
+        self._board = Board()
+        self._fen = START_FEN
+        self._moves = []
+        self._valid = True
+        self._search = None
+        self._thread = None
+
+        # Cleared while pondering, the search thread holds its bestmove back until ponderhit or stop sets it.
+        self._release = threading.Event()
+
+        # The limits of a 'go ponder', put on the search when ponderhit comes.
+        self._ponder_limits = None
+
+    def send(self, line):
+        """Writes one line of output. The search thread writes too, hence the lock."""
+        with self._output_lock:
+            self._output.write(line + '\n')
+            self._output.flush()
+
+    def run(self, commands=sys.stdin):
+        """Answers commands until quit or the input runs out."""
+        for line in commands:
+            if not self.handle(line):
+                break
+        self.stop_search()
+
+    def handle(self, line):
+        """Answers a single command. Returns False once it's time to quit."""
+
+        words = line.split()
+        if not words:
+            return True
+        command = words[0]
+
+        if command == 'ucci':
+            self.send('id name Xiangqi')
+            self.send('id author Mason Mabin')
+            self.send('ucciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'position':
+            self.stop_search()
+            self.set_position(words[1:])
+        elif command == 'go':
+            self.stop_search()
+            self.go(words[1:])
+        elif command == 'stop':
+            # The search thread sends bestmove itself once it notices.
+            if self._search is not None:
+                self._search.stop()
+            self._release.set()
+        elif command == 'ponderhit':
+            # The move pondered on was played, so the search is now on the clock.
+            if self._search is not None and self._ponder_limits is not None:
+                self._search.set_limits(*self._ponder_limits)
+            self._ponder_limits = None
+            self._release.set()
+        elif command == 'quit':
+            self.stop_search()
+            self.send('bye')
+            return False
+
+        # Anything else (setoption, banmoves, ...) is ignored.
+        return True
+
+    def stop_search(self):
+        """Stops the search if there is one, and waits for it to hand the board back."""
+        if self._thread is not None:
+            self._search.stop()
+            self._release.set()
+            self._thread.join()
+            self._thread = None
+            self._search = None
+
+    def set_position(self, words):
+        """Handles 'position {fen <fen> | startpos} [moves <move> ...]'. If the fen is the same as last time and the
+        moves carry on from (or stop short of) the last moves, the board is moved forward (or back) instead of
+        being set up again. If the position can't be set up, or one of the moves can't be played, go answers
+        nobestmove until a good position comes."""
+
+        self._valid = False
+
+        if 'moves' in words:
+            split = words.index('moves')
+            moves = words[split + 1:]
+            words = words[:split]
+        else:
+            moves = []
+
+        if words and words[0] == 'startpos':
+            fen = START_FEN
+        elif words and words[0] == 'fen':
+            fen = ' '.join(words[1:])
+        else:
+            return
+
+        # The move counters at the end of a fen don't change the position.
+        same_fen = fen.split()[:2] == self._fen.split()[:2]
+
+        if same_fen and moves[:len(self._moves)] == self._moves:
+            new_moves = moves[len(self._moves):]
+        elif same_fen and self._moves[:len(moves)] == moves:
+            for i in range(len(self._moves) - len(moves)):
+                self._board.undo_move()
+            self._moves = moves
+            new_moves = []
+        else:
+            if not self._board.load_fen(fen):
+                return
+            self._fen = fen
+            self._moves = []
+            new_moves = moves
+
+        # Stops at the first move that can't be played, so self._moves always matches the board.
+        for move in new_moves:
+            locations = ucci_to_locations(move)
+            if locations is None or not self._board.move_piece(*locations):
+                return
+            self._moves.append(move)
+
+        self._valid = True
+
+    def go(self, words):
+        """Handles 'go [ponder | draw] {depth <d> | time <ms> [movestogo <n>] [increment <ms>] | infinite}' by
+        starting a search thread. With ponder the search has no limits until ponderhit, and bestmove waits for
+        ponderhit or stop. draw offers are ignored."""
+
+        if not self._valid:
+            self.send('nobestmove')
+            return
+
+        # Pairs each option with the number after it.
+        options = {}
+        for i in range(len(words) - 1):
+            if words[i + 1].isdigit():
+                options[words[i]] = int(words[i + 1])
+
+        depth = options.get('depth')
+        movetime = None
+        if 'time' in options:
+            # Spreads the clock over the moves left, or 30 moves when it's sudden death (no movestogo, or 0).
+            movestogo = options.get('movestogo') or 30
+            movetime = (options['time'] / movestogo + options.get('increment', 0)) / 1000
+
+        if 'ponder' in words:
+            self._ponder_limits = (depth, movetime)
+            self._release.clear()
+            depth = None
+            movetime = None
+        else:
+            self._ponder_limits = None
+            self._release.set()
+
+        self._search = Search(self._board)
+        self._thread = threading.Thread(target=self.think, args=(self._search, depth, movetime), daemon=True)
+        self._thread.start()
+
+    def think(self, search, depth, movetime):
+        """Runs on the search thread. Reports each finished depth and then the best move."""
+        move = search.run(depth, movetime, self.report)
+
+        # Even if the search finished on its own, bestmove can't be sent while the GUI thinks it's pondering.
+        self._release.wait()
+        if move is None:
+            self.send('nobestmove')
+        else:
+            self.send('bestmove ' + locations_to_ucci(*move))
+
+    def report(self, search):
+        """Sends the info line for a finished depth."""
+        move = search.get_best_move()
+        line = 'info depth %d score %d nodes %d' % (search.get_depth(), search.get_score(), search.get_nodes())
+        if move is not None:
+            line += ' pv ' + locations_to_ucci(*move)
+        self.send(line)
+
+
+if __name__ == '__main__':
+    UcciEngine().run()